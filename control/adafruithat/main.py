@@ -31,6 +31,11 @@ import planktoscope.uuidName  # Note: this is deprecated.
 import planktoscope.display  # Fan HAT OLED screen
 from planktoscope.imager import mqtt as imager
 
+# The default sink formats and writes each message in the thread which logs it, so we replace it
+# with a sink which does that in the background, like the log file sink below:
+logger.remove()
+logger.add(sys.stderr, level="DEBUG", enqueue=True)
+
 # enqueue=True is necessary so we can log across modules
 # rotation happens everyday at 01:00 if not restarted
 # TODO: ensure the log directory exists
@@ -91,10 +96,8 @@ if __name__ == "__main__":
 
     # Let's make sure the used base path exists
     img_path = "/home/pi/PlanktoScope/img"  # FIXME: this path is incorrect - why doesn't it cause side effects?
-    # check if this path exists
-    if not os.path.exists(img_path):
-        # create the path!
-        os.makedirs(img_path)
+    # create the path if it doesn't exist yet
+    os.makedirs(img_path, exist_ok=True)
 
     logger.info(
         f"This PlanktoScope's Raspberry Pi's serial number is {planktoscope.uuidName.getSerial()}"
@@ -115,12 +118,14 @@ if __name__ == "__main__":
     stepper_thread = planktoscope.stepper.StepperProcess(shutdown_event)
     stepper_thread.start()
 
-    # Starts the imager control process
-    logger.info("Starting the imager control process (step 3/4)")
+    # Starts the imager control thread
+    # Note: the imager runs as a thread in this process, so it's started after all the other
+    # processes, to avoid forking this process while the imager's threads are running:
+    logger.info("Starting the imager control thread (step 3/4)")
     try:
         imager_thread = imager.Worker(shutdown_event)
     except Exception as e:
-        logger.error(f"The imager control process could not be started: {e}")
+        logger.error(f"The imager control thread could not be started: {e}")
         imager_thread = None
     else:
         imager_thread.start()
@@ -138,22 +143,24 @@ if __name__ == "__main__":
             logger.error("The stepper process died unexpectedly! Oh no!")
             break
         if not imager_thread or not imager_thread.is_alive():
-            logger.error("The imager process died unexpectedly! Oh no!")
+            logger.error("The imager thread died unexpectedly! Oh no!")
             break
         time.sleep(1)
 
     display.display_text("Bye Bye!")
     logger.info("Shutting down...")
     shutdown_event.set()
-    time.sleep(1)
 
-    stepper_thread.join()
+    # Note: the imager thread notices the shutdown event within a second, so we wait for it
+    # directly instead of sleeping for a fixed time; the timeout keeps a stuck imager from
+    # blocking the shutdown of the other processes:
     if imager_thread:
-        imager_thread.join()
+        imager_thread.join(timeout=5)
+        if imager_thread.is_alive():
+            logger.warning("The imager thread didn't stop in time")
+    stepper_thread.join()
 
     stepper_thread.close()
-    if imager_thread:
-        imager_thread.close()
 
     display.stop()
 
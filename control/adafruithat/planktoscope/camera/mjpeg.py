@@ -10,12 +10,20 @@ from http import server
 import loguru
 import typing_extensions
 
+# The header and trailer of each part of the multipart MJPEG stream, around each frame:
+_PART_HEADER_TEMPLATE = b"--FRAME\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n"
+_PART_TRAILER = b"\r\n"
+
 
 class ByteBufferStreamWatcher(typing_extensions.Protocol):
     """Interface for a stream of byte buffers where the latest one can be watched."""
 
-    def wait_next(self) -> None:
-        """Block until a new byte buffer is available on the stream of byte buffers."""
+    def wait_next(self, last_seen: typing.Optional[int] = None) -> int:
+        """Block until a byte buffer newer than the last-seen one is available on the stream.
+
+        Returns:
+            An identifier of the latest byte buffer, to pass as `last_seen` in the next call.
+        """
 
     def get(self) -> typing.Optional[bytes]:
         """Return the latest byte buffer from the stream of byte buffers."""
@@ -33,6 +41,14 @@ class _StreamingHandler(server.BaseHTTPRequestHandler):
         self._max_framerate = 25  # fps
         super().__init__(request, client_address, server_)
 
+    def setup(self) -> None:
+        """Prepare the connection to the HTTP client before handling its request."""
+        super().setup()
+        # Each MJPEG frame is sent in a single write, so there's nothing for Nagle's algorithm to
+        # coalesce; it would only delay the end of each frame until the client acknowledges the
+        # previous packets:
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
     @loguru.logger.catch
     # pylint: disable-next=invalid-name
     def do_GET(self):
@@ -77,10 +93,13 @@ class _StreamingHandler(server.BaseHTTPRequestHandler):
         # anomalies (i.e. unexpectedly high durations)
         self._send_mjpeg_header()
         last_frame_time = time.perf_counter()
+        # Tracking the last frame seen means that a frame which arrives while the previous frame is
+        # still being sent is picked up immediately, instead of waiting for the frame after it:
+        last_seen: typing.Optional[int] = None
         while True:
             waited = False
             while not waited or time.perf_counter() - last_frame_time < min_interval:
-                self.latest_frame.wait_next()
+                last_seen = self.latest_frame.wait_next(last_seen)
                 waited = True
             if (frame := self.latest_frame.get()) is None:
                 continue
@@ -99,12 +118,26 @@ class _StreamingHandler(server.BaseHTTPRequestHandler):
 
     def _send_mjpeg_frame(self, frame: bytes) -> None:
         """Send the next MJPEG frame from the stream."""
-        self.wfile.write(b"--FRAME\r\n")
-        self.send_header("Content-Type", "image/jpeg")
-        self.send_header("Content-Length", str(len(frame)))
-        self.end_headers()
-        self.wfile.write(frame)
-        self.wfile.write(b"\r\n")
+        part_header = _PART_HEADER_TEMPLATE % len(frame)
+        # The part header, frame, and part trailer are sent together as a single gather write, so
+        # that the frame is neither copied into a combined buffer nor split across several syscalls:
+        _sendmsg_all(self.connection, (part_header, frame, _PART_TRAILER))
+
+
+def _sendmsg_all(sock: socket.socket, buffers: typing.Iterable[bytes]) -> None:
+    """Send all the buffers, in order, over the socket with as few gather-writes as possible.
+
+    Raises:
+        OSError: the socket was closed or disconnected.
+    """
+    views = [memoryview(buffer) for buffer in buffers]
+    while views:
+        sent = sock.sendmsg(views)
+        # A blocking socket may still send only part of the data, so we must resume from there:
+        while views and sent >= len(views[0]):
+            sent -= len(views.pop(0))
+        if sent:
+            views[0] = views[0][sent:]
 
 
 class StreamingServer(server.ThreadingHTTPServer):
@@ -19,6 +19,7 @@
 from loguru import logger
 
 import datetime
+import functools
 import os
 
 import Adafruit_SSD1306
@@ -27,11 +28,77 @@ import PIL.Image
 import PIL.ImageDraw
 import PIL.ImageFont
 
+import smbus2
+
 logger.info("planktoscope.display is loading")
 
 import planktoscope.identity
 
 
+class _SSD1306_128_32(Adafruit_SSD1306.SSD1306_128_32):
+    """128x32 SSD1306 display which sends each frame as whole I2C messages.
+
+    The Adafruit driver writes the frame buffer through SMBus block writes of 16 bytes each,
+    i.e. one I2C transaction per 16 bytes of the frame. Here the address setup commands and the
+    frame buffer are each sent as a single plain I2C message.
+
+    Note: this relies on the driver keeping its frame buffer in `_buffer`, which holds for the
+    adafruit-ssd1306 release pinned in pyproject.toml (1.6.2, the final release of that package).
+    """
+
+    def __init__(self, rst, i2c_bus=1, i2c_address=Adafruit_SSD1306.SSD1306_I2C_ADDRESS):
+        super().__init__(rst=rst, i2c_bus=i2c_bus, i2c_address=i2c_address)
+        self.__bus = smbus2.SMBus(i2c_bus)
+        self.__address = i2c_address
+
+    def display(self):
+        """Write display buffer to physical display."""
+        # Control byte 0x00 (Co = 0, D/C = 0) is followed by a stream of commands
+        commands = smbus2.i2c_msg.write(
+            self.__address,
+            [
+                0x00,
+                Adafruit_SSD1306.SSD1306_COLUMNADDR,
+                0,  # Column start address
+                self.width - 1,  # Column end address
+                Adafruit_SSD1306.SSD1306_PAGEADDR,
+                0,  # Page start address
+                self.height // 8 - 1,  # Page end address
+            ],
+        )
+        self.__bus.i2c_rdwr(commands)
+        # Control byte 0x40 (Co = 0, D/C = 1) is followed by the whole frame buffer
+        self.__bus.i2c_rdwr(smbus2.i2c_msg.write(self.__address, [0x40] + self._buffer))
+
+    def close(self):
+        """Close the I2C bus used to write to the display."""
+        self.__bus.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font():
+    return PIL.ImageFont.truetype(font="truetype/dejavu/DejaVuSansMono.ttf", size=15)
+
+
+# The display only ever shows a handful of messages (the machine name and a few status
+# messages), so their rendered bitmaps are cached rather than rasterized again on every call
+@functools.lru_cache(maxsize=8)
+def _render_text(message, width, height):
+    # Create blank image for drawing.
+    # Make sure to create image with mode '1' for 1-bit color; it starts out black.
+    image = PIL.Image.new("1", (width, height))
+
+    # Get drawing object to draw on image.
+    draw = PIL.ImageDraw.Draw(image)
+
+    font = _load_font()
+    text_size = font.getsize_multiline(message)
+    x = width / 2 - text_size[0] / 2
+
+    draw.text((x, 0), message, font=font, fill=255, align="center")
+    return image
+
+
 class Display(object):
     display_available = True
 
@@ -40,7 +107,7 @@ class Display(object):
         RST = None  # on the PiOLED this pin isnt used
         try:
             # 128x32 display with hardware I2C:
-            self.__disp = Adafruit_SSD1306.SSD1306_128_32(rst=RST)
+            self.__disp = _SSD1306_128_32(rst=RST)
 
             # Initialize library.
             self.__disp.begin()
@@ -53,7 +120,6 @@ class Display(object):
 
     def display_machine_name(self):
         if self.display_available:
-            self.__clear()
             machineName = planktoscope.identity.load_machine_name()
             self.display_text(machineName.replace(" ", "\n"))
 
@@ -62,69 +128,18 @@ class Display(object):
             text = message.replace("\n", " ")
             logger.info(f"Displaying message {text}")
 
-            # Clear display.
-            self.__clear()
-            width = self.__disp.width
-            height = self.__disp.height
-
-            # Create blank image for drawing.
-            # Make sure to create image with mode '1' for 1-bit color.
-
-            image = PIL.Image.new("1", (width, height))
-
-            # Get drawing object to draw on image.
-            draw = PIL.ImageDraw.Draw(image)
-
-            # Draw a black filled box to clear the image.
-            draw.rectangle((0, 0, width, height), outline=0, fill=0)
-
-            # Draw some shapes.
-            # First define some constants to allow easy resizing of shapes.
-            padding = -2
-            top = padding
-            bottom = height - padding
-            # Move left to right keeping track of the current x position for drawing shapes.
-            x = 0
-
-            # Load default font.
-            font = PIL.ImageFont.truetype(
-                font="truetype/dejavu/DejaVuSansMono.ttf", size=15
-            )
-
-            # Draw a black filled box to clear the image.
-            draw.rectangle((0, 0, width, height), outline=0, fill=0)
-
-            text_size = font.getsize_multiline(message)
-            x = width / 2 - text_size[0] / 2
-
-            draw.text((x, 0), message, font=font, fill=255, align="center")
-
-            # draw.text((0, top + 15), "READY", font=font, fill=255)
-            # now = datetime.datetime.isoformat(datetime.datetime.now())[:-16]
-            # draw.text(
-            #    (68, 0),
-            #    now,
-            #    font=PIL.ImageFont.truetype(font="truetype/dejavu/DejaVuSansMono.ttf", size=10),
-            #    fill=255,
-            # )
-            #    draw.text((x, top + 16), str(Disk), font=font, fill=255)
-            #    draw.text((x, top + 24), "wlan0:" + str(IP), font=font, fill=255)
+            image = _render_text(message, self.__disp.width, self.__disp.height)
 
             # Display image.
             self.__disp.image(image)
             self.__disp.display()
 
-    def __clear(self):
-        if self.display_available:
-            logger.trace("Clear the display")
-            # Clear display.
-            self.__disp.clear()
-            self.__disp.display()
-
     def stop(self):
         if self.display_available:
             logger.info("Display is out!")
             self.display_text("Cut the power\nin 5s")
+            self.__disp.close()
+            self.display_available = False
 
 
 if __name__ == "__main__":
@@ -11,6 +11,7 @@ import enum
 import os
 import threading
 import typing
+from concurrent import futures
 
 import loguru
 import typing_extensions
@@ -50,8 +51,15 @@ class PumpRunner(typing_extensions.Protocol):
 class FileCapturer(typing_extensions.Protocol):
     """Interface for something which can capture images to files."""
 
-    def capture_file(self, filename: str) -> None:
-        """Capture an image to the specified filename."""
+    def capture_file_async(
+        self, filename: str
+    ) -> tuple["futures.Future[typing.Any]", "futures.Future[None]"]:
+        """Start capturing an image to the specified filename.
+
+        Returns:
+            A future which completes once the image has been taken, and a future which completes
+            once the image has been saved to the file.
+        """
 
 
 class Settings(typing.NamedTuple):
@@ -102,17 +110,18 @@ class Routine:
         self._progress = 0  # the number of images acquired so far
         self._progress_lock = threading.Lock()
 
-    def run_step(self) -> typing.Optional[tuple[int, str]]:
+    def run_step(self) -> typing.Optional[tuple[int, str, "futures.Future[None]"]]:
         """Run a single step of the stop-flow imaging routine.
 
         Does nothing if the routine is already done (whether because all images have already been
         acquired, or because the routine was manually interrupted by calling the `stop()` method).
         Blocks until the step is complete (whether because it has finished or because the routine
-        was manually interrupted).
+        was manually interrupted); the step is complete once its image has been taken, but the image
+        may still be in the process of being saved.
 
         Returns:
-            The index of the image which was just saved and the filename of the image which was just
-            saved, or `None` if the routine was already done
+            The index of the image which was just taken, the filename of that image, and a future
+            which completes once the image has been saved; or `None` if the routine was already done
         """
         if self.interrupted:
             return None
@@ -132,14 +141,15 @@ class Routine:
                 f"Capturing image {self._progress}/{self.settings.total_images} to "
                 + f"{capture_path}...",
             )
-            self._camera.capture_file(capture_path)
-            os.sync()
-            # Note(ethanjli): updating the integrity file is the responsibility of the code which
-            # calls this `run_step()` method.
+            taken, saved = self._camera.capture_file_async(capture_path)
+            taken.result()
+            # Note: the sample can be moved as soon as the image has been taken, so
+            # waiting for the image to be saved (and flushed to storage) and updating the integrity
+            # file are the responsibility of the code which calls this `run_step()` method.
 
             acquired_index = self._progress
             self._progress += 1
-            return acquired_index, filename
+            return acquired_index, filename, saved
 
     def stop(self) -> None:
         """Stop the routine if it's running."""
@@ -70,6 +70,7 @@
 # We can use collections.deque https://docs.python.org/3/library/collections.html#collections.deque
 import paho.mqtt.client as mqtt
 import json
+import threading
 
 # Logger library compatible with multiprocessing
 from loguru import logger
@@ -88,7 +89,8 @@ class MQTT_Client:
         # Declare the global variables command and args
         self.command = ""
         self.args = ""
-        self.__new_message = False
+        # Set when a new message is received, so that callers can block until one arrives
+        self.__new_message = threading.Event()
         self.msg = None
 
         # MQTT Client functions definition
@@ -157,7 +159,7 @@ class MQTT_Client:
         logger.debug(f"args are {self.args}")
         self.msg = {"topic": msg.topic, "payload": self.args}
         logger.debug(f"msg is {self.msg} or {msg}")
-        self.__new_message = True
+        self.__new_message.set()
 
     @logger.catch
     def on_disconnect(self, client, userdata, rc):
@@ -171,11 +173,18 @@ class MQTT_Client:
         # in case of communication loss with the server
 
     def new_message_received(self):
-        return self.__new_message
+        return self.__new_message.is_set()
+
+    def wait_for_message(self, timeout=None):
+        """Block until a new message is received, or until the timeout (in seconds) expires
+
+        Returns True if a new message was received
+        """
+        return self.__new_message.wait(timeout)
 
     def read_message(self):
         logger.debug("clearing the __new_message flag")
-        self.__new_message = False
+        self.__new_message.clear()
 
     @logger.catch
     def shutdown(self, topic="", message=""):
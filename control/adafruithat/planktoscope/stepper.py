@@ -40,6 +40,8 @@ class StepperWaveshare:
         self.step_pin = step_pin
         self.enable_pin = enable_pin
         self.stepper_type = stepper_type
+        # Direction currently applied on the dir/enable pins, or None if the motor is released
+        self.__direction = None
 
         RPi.GPIO.setmode(RPi.GPIO.BCM)
         RPi.GPIO.setwarnings(False)
@@ -58,6 +60,7 @@ class StepperWaveshare:
         RPi.GPIO.output(pin, value)
 
     def stop(self):
+        self.__direction = None
         if self.stepper_type == "waveshareRev2.1":
             self.__digital_write(self.enable_pin, 0)
         else:
@@ -67,28 +70,29 @@ class StepperWaveshare:
         """Performs one step.
         :param int direction: Either `FORWARD` or `BACKWARD`"""
 
-        if direction == adafruit_motor.stepper.FORWARD:
-            if self.stepper_type == "waveshareRev2.1":
-                self.__digital_write(self.enable_pin, 1)
-            else:
-                self.__digital_write(self.enable_pin, 0)
-            self.__digital_write(self.dir_pin, 1)
-        elif direction == adafruit_motor.stepper.BACKWARD:
-            if self.stepper_type == "waveshareRev2.1":
-                self.__digital_write(self.enable_pin, 1)
-            else:
-                self.__digital_write(self.enable_pin, 0)
-            self.__digital_write(self.dir_pin, 0)
-        else:
+        if direction not in (
+            adafruit_motor.stepper.FORWARD,
+            adafruit_motor.stepper.BACKWARD,
+        ):
             logger.error(
                 "The direction must be : adafruit_motor.stepper.FORWARD or adafruit_motor.stepper.BACKWARD"
             )
             self.release()
             return
 
-        # This delay is just to make sure the chip had time to take the dir/enable pin
-        # into account, min delay is 650ns
-        time.sleep(0.000001)
+        # The dir and enable pins keep their level between steps, so they only need to be
+        # written when the direction changes (or after the motor has been released)
+        if direction != self.__direction:
+            enable = 1 if self.stepper_type == "waveshareRev2.1" else 0
+            dir_level = 1 if direction == adafruit_motor.stepper.FORWARD else 0
+            # Both pins are set in a single call to the GPIO library
+            self.__digital_write([self.enable_pin, self.dir_pin], [enable, dir_level])
+            self.__direction = direction
+            # This delay is just to make sure the chip had time to take the dir/enable pin
+            # into account, min delay is 650ns. It's not needed when the pins were left
+            # unchanged since the previous step.
+            time.sleep(0.000001)
+
         self.__digital_write(self.step_pin, True)
         # This delay is the minimal time high for the step impulse, 2µs
         time.sleep(0.000005)
@@ -3,12 +3,12 @@
 import io
 import threading
 import typing
+from concurrent import futures
 
 import loguru
 import picamera2  # type: ignore
 import typing_extensions
 from picamera2 import encoders, outputs
-from readerwriterlock import rwlock
 
 
 class StreamConfig(typing.NamedTuple):
@@ -29,7 +29,9 @@ class StreamConfig(typing.NamedTuple):
     # The number of frame buffers to allocate in memory:
     # Note(ethanjli): from testing, it seems that we need at least three buffers to allow the
     # preview to continue receiving frames smoothly from the "lores" stream while a buffer is
-    # reserved for saving an image from the "main" stream.
+    # reserved for saving an image from the "main" stream. Each buffer holds a full-resolution
+    # frame, so on low-memory devices this is the main knob for reducing memory usage (at the cost
+    # of a less smooth preview during captures).
     buffer_count: int = 3
     # Whether to allow the last queued frame to be returned for a capture, even if that frame was
     # saved before the capture request:
@@ -37,14 +39,22 @@ class StreamConfig(typing.NamedTuple):
 
     def overlay(self, updates: "StreamConfig") -> "StreamConfig":
         """Create a new instance where provided non-`None` values overwrite existing values."""
-        # pylint complains that this namedtuple has no `_asdict()` method even though mypy is fine;
-        # this is a false positive:
-        # pylint: disable-next=no-member
+        # Note: zipping the fields with the namedtuple's values avoids building the intermediate
+        # dict which `_asdict()` would create.
         return self._replace(
-            **{key: value for key, value in updates._asdict().items() if value is not None}
+            **{
+                key: value
+                for key, value in zip(_STREAM_CONFIG_FIELDS, updates)
+                if value is not None
+            }
         )
 
 
+# pylint complains that this namedtuple has no `_fields` attribute even though mypy is fine; this is
+# a false positive:
+_STREAM_CONFIG_FIELDS = StreamConfig._fields  # pylint: disable=no-member
+
+
 def _picamera2_to_stream_config(config: dict[str, typing.Any]) -> StreamConfig:
     """Create a StreamConfig from a picamera2 pre-start configuration.
 
@@ -91,85 +101,136 @@ class SettingsValues(typing.NamedTuple):
     # need them yet and we're trying to minimize the amount of code we have to maintain, so for now
     # I haven't implemented them.
 
-    def validate(self) -> list[str]:
+    def validate(self) -> typing.Iterator[str]:
         """Look for values which are invalid because they're out-of-range.
 
-        Returns:
-            A list of strings, each representing a validation error.
+        Yields:
+            Strings, each representing a validation error.
         """
         value: typing.Any = None
-        errors = self._validate_exposure_time()
-        if (value := self.image_gain) is not None and not 0.0 <= value <= 16.0:
-            errors.append(f"Image gain out of range [0.0, 16.0]: {value}")
-        if (value := self.brightness) is not None and not -1.0 <= value <= 1.0:
-            errors.append(f"Brightness out of range [-1.0, 1.0]: {value}")
-        if (value := self.contrast) is not None and not 0.0 <= value <= 32.0:
-            errors.append(f"Contrast out of range [0.0, 32.0]: {value}")
-        if (value := self.white_balance_gains) is not None and not 0.0 <= value.red <= 32.0:
-            errors.append(f"Red white-balance gain out of range [0.0, 32.0]: {value.red}")
-        if (value := self.white_balance_gains) is not None and not 0.0 <= value.blue <= 32.0:
-            errors.append(f"Blue white-balance gain out of range [0.0, 32.0]: {value.blue}")
-        if (value := self.sharpness) is not None and not 0.0 <= value <= 16.0:
-            errors.append(f"Sharpness out of range [0.0, 16.0]: {value}")
-        if (value := self.jpeg_quality) is not None and not 0 <= value <= 95:
-            errors.append(f"JPEG quality out of range [0, 95]: {value}")
-
-        return errors
-
-    def _validate_exposure_time(self) -> list[str]:
+        yield from self._validate_exposure_time()
+        for field, subfield, min_value, max_value, label in _SETTINGS_RANGES:
+            if (value := getattr(self, field)) is None:
+                continue
+            if subfield is not None:
+                value = getattr(value, subfield)
+            if not min_value <= value <= max_value:
+                yield f"{label} out of range [{min_value}, {max_value}]: {value}"
+
+    def _validate_exposure_time(self) -> typing.Iterator[str]:
         """Check whether exposure_time is consistent with frame_duration_limits."""
         if (value := self.exposure_time) is None:
-            return []
+            return
 
         if (limits := self.frame_duration_limits) is None:
             if value < 0:
-                return [f"Exposure time out of range [0, +Inf]: {value}"]
-            return []
+                yield f"Exposure time out of range [0, +Inf]: {value}"
+            return
 
         # This is a pylint false-positive, since mypy knows `limits` is an unpackable tuple:
         min_limit, max_limit = limits  # pylint: disable=unpacking-non-sequence
         if not min_limit <= value <= max_limit:
-            return [f"Exposure time out of range [{min_limit}, {max_limit}]: {value}"]
-
-        return []
+            yield f"Exposure time out of range [{min_limit}, {max_limit}]: {value}"
 
     def has_values(self) -> bool:
         """Check whether any values are non-`None`."""
-        # pylint complains that this namedtuple has no `_asdict()` method even though mypy is fine;
-        # this is a false positive:
-        # pylint: disable-next=no-member
-        return any(value is not None for value in self._asdict().values())
+        return any(value is not None for value in self)
 
     def overlay(self, updates: "SettingsValues") -> "SettingsValues":
         """Create a new instance where provided non-`None` values overwrite existing values.
 
         This is intended to make it easy to combine existing settings with new settings.
         """
-        # pylint complains that this namedtuple has no `_asdict()` method even though mypy is fine;
-        # this is a false positive:
-        # pylint: disable-next=no-member
+        # Note: zipping the fields with the namedtuple's values avoids building the intermediate
+        # dict which `_asdict()` would create.
         return self._replace(
-            **{key: value for key, value in updates._asdict().items() if value is not None}
+            **{key: value for key, value in zip(_SETTINGS_FIELDS, updates) if value is not None}
         )
 
+    def apply(
+        self, updates: "SettingsValues"
+    ) -> tuple["SettingsValues", dict[str, typing.Any], dict[str, typing.Any]]:
+        """Overlay the updates and find the picamera2 controls & options which they would set.
+
+        This combines `overlay()` with `as_picamera2_controls()` and `as_picamera2_options()` in a
+        single pass over the fields, where only the updated values are converted.
+
+        Every provided value is converted, even if it equals the existing value: the existing values
+        only reflect what was last requested, and the camera's auto-exposure and auto-white-balance
+        algorithms may have since changed the corresponding controls on the camera.
+
+        Returns:
+            The new values, followed by a dict of the picamera2 controls which need to be set and a
+            dict of the picamera2 options which need to be set.
+
+        Raises:
+            ValueError: some of the new values are out of the allowed ranges.
+        """
+        changes: dict[str, typing.Any] = {}
+        controls: dict[str, typing.Any] = {}
+        options: dict[str, typing.Any] = {}
+        for key, value in zip(_SETTINGS_FIELDS, updates):
+            if value is None:
+                continue
+            changes[key] = value
+            if (control := _PICAMERA2_CONTROLS.get(key)) is not None:
+                controls[control] = value
+            elif (option := _PICAMERA2_OPTIONS.get(key)) is not None:
+                options[option] = value
+
+        if not changes:
+            return self, controls, options
+        new_values = self._replace(**changes)
+        if errors := list(new_values.validate()):
+            raise ValueError(f"Invalid settings: {'; '.join(errors)}")
+        return new_values, controls, options
+
     def as_picamera2_controls(self) -> dict[str, typing.Any]:
         """Create an equivalent dict of values for picamera2's camera controls."""
-        result = {
-            "AeEnable": self.auto_exposure,
-            "ExposureTime": self.exposure_time,
-            "AnalogueGain": self.image_gain,
-            "Brightness": self.brightness,
-            "Contrast": self.contrast,
-            "AwbEnable": self.auto_white_balance,
-            "ColourGains": self.white_balance_gains,
-            "Sharpness": self.sharpness,
+        return {
+            control: value
+            for field, control in _PICAMERA2_CONTROLS.items()
+            if (value := getattr(self, field)) is not None
         }
-        return {key: value for key, value in result.items() if value is not None}
 
     def as_picamera2_options(self) -> dict[str, typing.Any]:
         """Create an equivalent dict of values suitable for picamera2's camera options."""
-        result = {"quality": self.jpeg_quality}
-        return {key: value for key, value in result.items() if value is not None}
+        return {
+            option: value
+            for field, option in _PICAMERA2_OPTIONS.items()
+            if (value := getattr(self, field)) is not None
+        }
+
+
+# pylint complains that this namedtuple has no `_fields` attribute even though mypy is fine; this is
+# a false positive:
+_SETTINGS_FIELDS = SettingsValues._fields  # pylint: disable=no-member
+
+# Names of the picamera2 camera controls & options corresponding to SettingsValues fields, keyed
+# by field name:
+_PICAMERA2_CONTROLS: dict[str, str] = {
+    "auto_exposure": "AeEnable",
+    "exposure_time": "ExposureTime",
+    "image_gain": "AnalogueGain",
+    "brightness": "Brightness",
+    "contrast": "Contrast",
+    "auto_white_balance": "AwbEnable",
+    "white_balance_gains": "ColourGains",
+    "sharpness": "Sharpness",
+}
+_PICAMERA2_OPTIONS: dict[str, str] = {"jpeg_quality": "quality"}
+
+# Allowed ranges of SettingsValues fields, in the order they're validated. Each entry is:
+# (field, subfield or None, min value, max value, label used in validation errors)
+_SETTINGS_RANGES: tuple[tuple[str, typing.Optional[str], float, float, str], ...] = (
+    ("image_gain", None, 0.0, 16.0, "Image gain"),
+    ("brightness", None, -1.0, 1.0, "Brightness"),
+    ("contrast", None, 0.0, 32.0, "Contrast"),
+    ("white_balance_gains", "red", 0.0, 32.0, "Red white-balance gain"),
+    ("white_balance_gains", "blue", 0.0, 32.0, "Blue white-balance gain"),
+    ("sharpness", None, 0.0, 16.0, "Sharpness"),
+    ("jpeg_quality", None, 0, 95, "JPEG quality"),
+)
 
 
 def _picamera2_to_settings_values(config: dict[str, typing.Any]) -> SettingsValues:
@@ -209,6 +270,22 @@ def config_to_settings_values(config: dict[str, typing.Any]) -> SettingsValues:
     return result
 
 
+# Names of camera models, keyed by the names of their sensors:
+_CAMERA_NAMES = {
+    "IMX219": "Camera v2.1",
+    # Note(ethanjli): Currently the PlanktoScope GUI requires this to be "HQ Camera" rather than
+    # "Camera HQ".
+    "IMX477": "HQ Camera",
+}
+
+
+class Capture(typing.NamedTuple):
+    """The progress of an image capture running in the background."""
+
+    taken: "futures.Future[typing.Any]"  # done once the image has been taken from the camera
+    saved: "futures.Future[None]"  # done once the image has been saved as a file
+
+
 class PiCamera:
     """A thread-safe and type-safe wrapper around a picamera2-based camera.
 
@@ -241,13 +318,20 @@ class PiCamera:
             initial_settings: any camera settings to initialize the camera with.
         """
         # Settings & configuration
-        self._settings_lock = rwlock.RWLockWrite()
+        # Note: the stream config and cached settings are immutable values which are only
+        # ever replaced as a whole, and reading an attribute is atomic in CPython, so readers never
+        # need to take the lock; it only serializes writers (which read-modify-write the values):
+        self._settings_lock = threading.Lock()
         self._stream_config = stream_config
         self._cached_settings = initial_settings
 
         # I/O:
         self._preview_output = preview_output
         self._camera: typing.Optional[picamera2.Picamera2] = None
+        self._sensor_name: typing.Optional[str] = None
+        # Note: captures are serialized through a single worker thread, so that callers
+        # can overlap other work (e.g. moving the sample) with waiting for a full-resolution frame:
+        self._capture_executor: typing.Optional[futures.ThreadPoolExecutor] = None
 
     def open(self) -> None:
         """Start the camera in the background, including output to the preview stream.
@@ -260,12 +344,20 @@ class PiCamera:
         except RuntimeError as e:
             self._camera = None
             raise RuntimeError("Could not initialize the camera!") from e
+        # The sensor can't change while the camera is open, so its name only needs to be read once:
+        model = self._camera.camera_properties["Model"]
+        assert isinstance(model, str)
+        self._sensor_name = model.upper()
 
         loguru.logger.debug("Configuring the camera...")
         main_config: dict[str, typing.Any] = {}
         if (main_size := self._stream_config.capture_size) is not None:
             main_config["size"] = main_size
-        lores_config: dict[str, typing.Any] = {}
+        # Note: the MJPEG encoder takes YUV420 input directly, and at 12 bits/pixel it's
+        # the cheapest format for the preview frames in terms of memory and memory bandwidth; it's
+        # also the only format allowed for the "lores" stream on the RPi 4, so we pin it explicitly
+        # rather than relying on picamera2's defaults:
+        lores_config: dict[str, typing.Any] = {"format": "YUV420"}
         if (lores_size := self._stream_config.preview_size) is not None:
             lores_config["size"] = lores_size
         # Note(ethanjli): we use the `create_still_configuration` to get the best defaults for still
@@ -276,11 +368,13 @@ class PiCamera:
             buffer_count=self._stream_config.buffer_count,
             queue=self._stream_config.queue,
         )
-        loguru.logger.debug(f"Camera configuration: {config}")
+        loguru.logger.opt(lazy=True).debug("Camera configuration: {}", lambda: config)
         self._camera.configure(config)
-        with self._settings_lock.gen_wlock():
+        with self._settings_lock:
             self._stream_config = self._stream_config.overlay(_picamera2_to_stream_config(config))
-            loguru.logger.debug(f"Final stream configuration: {self._stream_config}")
+            loguru.logger.opt(lazy=True).debug(
+                "Final stream configuration: {}", lambda: self._stream_config
+            )
 
         initial_settings = self._cached_settings.overlay(_picamera2_to_settings_values(config))
         loguru.logger.debug("Initializing camera settings...")
@@ -293,25 +387,26 @@ class PiCamera:
             # details, refer to Table 1 on page 59 of the picamera2 manual. So we must use
             # `MJPEGEncoder` instead:
             encoders.MJPEGEncoder(bitrate=self._stream_config.preview_bitrate),
-            outputs.FileOutput(self._preview_output),
+            _StreamOutput(self._preview_output),
             # If we specify quality, it overrides the bitrate, contrary to what the picamera2 docs
             # say (refer to
             # github.com/raspberrypi/picamera2/blob/main/picamera2/encoders/mjpeg_encoder.py#L23):
             # quality=encoders.Quality.VERY_HIGH,
             name="lores",
         )
+        self._capture_executor = futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="camera-capture"
+        )
 
     @property
     def stream_config(self) -> StreamConfig:
         """An immutable copy of the camera streams configuration."""
-        with self._settings_lock.gen_rlock():
-            return self._stream_config
+        return self._stream_config
 
     @property
     def settings(self) -> SettingsValues:
         """Adjustable camera settings values."""
-        with self._settings_lock.gen_rlock():
-            return self._cached_settings
+        return self._cached_settings
 
     @settings.setter
     def settings(self, updates: SettingsValues) -> None:
@@ -330,15 +425,22 @@ class PiCamera:
         if self._camera is None:
             raise RuntimeError("The camera has not been started yet!")
 
-        loguru.logger.debug(f"Applying camera settings updates: {updates}")
-        with self._settings_lock.gen_wlock():
-            new_values = self._cached_settings.overlay(updates)
-            loguru.logger.debug(f"New camera settings will be: {new_values}")
-            if errors := new_values.validate():
-                raise ValueError(f"Invalid settings: {'; '.join(errors)}")
-            loguru.logger.debug(f"Setting picamera2 controls: {new_values.as_picamera2_controls()}")
-            self._camera.set_controls(new_values.as_picamera2_controls())
-            for key, value in updates.as_picamera2_options().items():
+        # Note: these debug messages are formatted lazily, since building the reprs of settings
+        # values is wasted work on every update whenever debug logging is disabled.
+        loguru.logger.opt(lazy=True).debug("Applying camera settings updates: {}", lambda: updates)
+        with self._settings_lock:
+            # The controls in the update are sent as one batch, and only if there are any (e.g. an
+            # update of only the JPEG quality is just an option change):
+            new_values, controls, options = self._cached_settings.apply(updates)
+            loguru.logger.opt(lazy=True).debug(
+                "New camera settings will be: {}", lambda: new_values
+            )
+            if controls:
+                loguru.logger.opt(lazy=True).debug(
+                    "Setting picamera2 controls: {}", lambda: controls
+                )
+                self._camera.set_controls(controls)
+            for key, value in options.items():
                 self._camera.options[key] = value
             self._cached_settings = new_values
 
@@ -354,12 +456,10 @@ class PiCamera:
             RuntimeError: the method was called before the camera was started, or after it was
               closed.
         """
-        if self._camera is None:
+        if self._camera is None or self._sensor_name is None:
             raise RuntimeError("The camera has not been started yet!")
 
-        model = self._camera.camera_properties["Model"]
-        assert isinstance(model, str)
-        return model.upper()
+        return self._sensor_name
 
     @property
     def camera_name(self) -> str:
@@ -376,13 +476,7 @@ class PiCamera:
         if self._camera is None:
             raise RuntimeError("The camera has not been started yet!")
 
-        camera_names = {
-            "IMX219": "Camera v2.1",
-            # Note(ethanjli): Currently the PlanktoScope GUI requires this to be "HQ Camera" rather
-            # than "Camera HQ".
-            "IMX477": "HQ Camera",
-        }
-        return camera_names.get(self.sensor_name, "Not recognized")
+        return _CAMERA_NAMES.get(self.sensor_name, "Not recognized")
 
     def capture_file(self, path: str) -> None:
         """Capture an image from the main stream (in full resolution) and save it as a file.
@@ -396,18 +490,78 @@ class PiCamera:
             RuntimeError: the method was called before the camera was started, or after it was
               closed.
         """
+        self.capture_file_async(path).saved.result()
+
+    def capture_file_async(self, path: str) -> Capture:
+        """Start capturing an image from the main stream and saving it as a file.
+
+        Captures are performed one at a time in the background, in the order they were requested.
+        Because saving an image takes much longer than taking it, the caller can wait for the image
+        to be taken and then carry on (e.g. by moving the sample) while the image is being saved.
+
+        Args:
+            path: The file path where the image should be saved.
+
+        Returns:
+            The futures tracking when the image has been taken and when it has been fully saved.
+
+        Raises:
+            RuntimeError: the method was called before the camera was started, or after it was
+              closed.
+        """
+        if self._camera is None or self._capture_executor is None:
+            raise RuntimeError("The camera has not been started yet!")
+
+        # Note: the executor has a single worker, so the image is always saved right
+        # after it's taken, before any later capture is started:
+        taken = self._capture_executor.submit(self._take_image, path)
+        saved = self._capture_executor.submit(self._save_image, taken, path)
+        return Capture(taken=taken, saved=saved)
+
+    def _take_image(self, path: str) -> tuple[typing.Any, dict[str, typing.Any]]:
+        """Capture an image from the main stream, blocking until it's been taken.
+
+        Returns:
+            The image and its metadata.
+
+        Raises:
+            RuntimeError: the camera was closed before the capture could start.
+        """
         if self._camera is None:
             raise RuntimeError("The camera has not been started yet!")
 
-        loguru.logger.debug(f"Capturing and saving image to {path}...")
+        loguru.logger.debug("Capturing image for {}...", path)
         request = self._camera.capture_request()
+        # Note: JPEG-encoding a full-resolution image in software takes much longer than
+        # a frame interval, so we copy the image out of the camera's buffer and release the
+        # request before encoding; otherwise the request would keep one of the camera's few
+        # buffers away from the camera (stalling the preview stream) for the whole encode.
         # The following lines are false-positives in pylint because they're dynamically-generated
         # members:
-        request.save("main", path)  # pylint: disable=no-member
-        loguru.logger.debug(
-            f"Image metadata: {request.get_metadata()}"  # pylint: disable=no-member
-        )
-        request.release()  # pylint: disable=no-member
+        try:
+            image = request.make_image("main")  # pylint: disable=no-member
+            metadata = request.get_metadata()  # pylint: disable=no-member
+        finally:
+            request.release()  # pylint: disable=no-member
+        # Note: the image metadata has dozens of fields, so its repr is only built if debug logging
+        # is enabled:
+        loguru.logger.opt(lazy=True).debug("Image metadata: {}", lambda: metadata)
+        return image, metadata
+
+    def _save_image(
+        self, taken: "futures.Future[tuple[typing.Any, dict[str, typing.Any]]]", path: str
+    ) -> None:
+        """Save an image which was taken by `_take_image()` as a file, blocking until saved.
+
+        Raises:
+            RuntimeError: the camera was closed before the capture could start.
+        """
+        image, metadata = taken.result()  # re-raises any error from taking the image
+        assert self._camera is not None  # the camera is only closed after all captures finish
+
+        loguru.logger.debug("Saving image to {}...", path)
+        # This is equivalent to `request.save("main", path)`, including the EXIF metadata:
+        self._camera.helpers.save(image, metadata, path)
 
     def close(self) -> None:
         """Stop and close the camera.
@@ -419,6 +573,11 @@ class PiCamera:
         if self._camera is None:
             return
 
+        if self._capture_executor is not None:
+            loguru.logger.debug("Waiting for pending captures to finish...")
+            self._capture_executor.shutdown(wait=True)
+            self._capture_executor = None
+
         loguru.logger.debug("Stopping the camera...")
         # Note(ethanjli): when picamera2 itself crashes while recording in the background, calling
         # `stop_recording()` causes a deadlock! I don't know how to work around that deadlock; this
@@ -430,9 +589,62 @@ class PiCamera:
         loguru.logger.debug("Closing the camera...")
         self._camera.close()
         self._camera = None
+        self._sensor_name = None
         self._cached_settings = SettingsValues()
 
 
+# picamera2 has no type hints, so mypy sees its classes as `Any`:
+class _StreamOutput(outputs.Output):  # type: ignore[misc]
+    """A picamera2 output which writes each encoded frame to a stream as a single buffer.
+
+    Unlike picamera2's `FileOutput`, this skips the per-frame flush and timestamp bookkeeping, and
+    hands each frame over exactly as the encoder produced it; this is all that's needed for an
+    MJPEG stream, where every frame is a complete JPEG image (and a keyframe).
+    """
+
+    def __init__(self, stream: io.BufferedIOBase) -> None:
+        """Initialize the output.
+
+        Args:
+            stream: the stream to write frames to.
+        """
+        super().__init__()
+        self._stream = stream
+
+    # pylint: disable-next=too-many-arguments
+    def outputframe(
+        self,
+        frame: bytes,
+        keyframe: bool = True,
+        timestamp: typing.Optional[int] = None,
+        packet: typing.Any = None,
+        audio: bool = False,
+    ) -> None:
+        """Write an encoded frame to the stream, if the output is currently recording."""
+        if self.recording and not audio:
+            self._stream.write(frame)
+
+
+def _freeze(buffer: typing_extensions.Buffer) -> bytes:
+    """Return the contents of the buffer as `bytes`, copying them only if they could change later.
+
+    picamera2's encoders hand each frame to their outputs as a fresh `bytes` object, which is
+    immutable and so can be used as-is; the same goes for a view over the whole of such an object.
+    Any other kind of buffer (e.g. a `bytearray`, or a `memoryview` into a reused buffer) could be
+    modified by the writer after it's handed over, so its contents must be copied.
+    """
+    if isinstance(buffer, bytes):
+        return buffer
+    if (
+        isinstance(buffer, memoryview)
+        and isinstance(buffer.obj, bytes)
+        and buffer.c_contiguous
+        and buffer.nbytes == len(buffer.obj)
+    ):
+        return buffer.obj
+    return bytes(buffer)
+
+
 class PreviewStream(io.BufferedIOBase):
     """A thread-safe stream of discrete byte buffers for use in live previews.
 
@@ -448,41 +660,62 @@ class PreviewStream(io.BufferedIOBase):
 
     def __init__(self) -> None:
         """Initialize the stream."""
+        # Note: the latest buffer is an immutable `bytes` object which is only ever
+        # replaced (never modified), and rebinding/reading an attribute is atomic in CPython, so
+        # readers and writers don't need a lock to avoid data races on it:
         self._latest_buffer: typing.Optional[bytes] = None
-        # Mutex to prevent data races between readers and writers:
-        self._latest_buffer_lock = rwlock.RWLockWrite()
-        # Condition variable to allow listeners to wait for a new buffer:
-        self._available = threading.Condition()
+        # Count of buffers written so far, so that listeners can tell whether they've seen the
+        # latest buffer:
+        self._generation = 0
+        # Event to allow listeners to wait for the next buffer. Each write sets the current event
+        # and replaces it with a fresh (unset) one for the following buffer, so that no listener
+        # can miss a notification between a `set()` and a `clear()`:
+        self._next_available = threading.Event()
 
     def write(self, buffer: typing_extensions.Buffer) -> int:
         """Write the byte buffer as the latest buffer in the stream.
 
-        If readers are accessing the buffer when this method is called, then it may block for a
-        while, in order to wait for those readers to finish.
+        This never blocks on readers, since they only ever hold references to previous buffers.
 
         Returns:
             The length of the byte buffer written.
         """
-        b = bytes(buffer)
-        with self._latest_buffer_lock.gen_wlock():
-            self._latest_buffer = b
-        with self._available:
-            self._available.notify_all()
+        b = _freeze(buffer)
+        self._latest_buffer = b
+        # Note: the generation must be advanced before the event is swapped, for `wait_next()`.
+        self._generation += 1
+        # Note: this swap is safe because there's only ever a single writer (the encoder thread):
+        available, self._next_available = self._next_available, threading.Event()
+        available.set()
         return len(b)
 
-    def wait_next(self) -> None:
-        """Wait until the next buffer is available.
+    def wait_next(self, last_seen: typing.Optional[int] = None) -> int:
+        """Wait until a buffer newer than the last-seen buffer is available.
+
+        When called, this method blocks until it is awakened by a `write()` call in another
+        thread, unless a buffer was already written after the last-seen buffer. Once awakened, it
+        returns.
 
-        When called, this method blocks until it is awakened by a `update()` call in another
-        thread. Once awakened, it returns.
+        Args:
+            last_seen: the value returned by the listener's previous call of this method. If `None`,
+              waits for the next `write()` call.
+
+        Returns:
+            A generation number identifying the latest buffer, to pass in the next call.
         """
-        with self._available:
-            self._available.wait()
+        # Note: the event must be fetched before the generation is checked; otherwise a write could
+        # happen in between, and we'd only be woken up by the write after it.
+        available = self._next_available
+        if last_seen is None:
+            last_seen = self._generation
+        while self._generation == last_seen:
+            available.wait()
+            available = self._next_available
+        return self._generation
 
     def get(self) -> typing.Optional[bytes]:
-        """Return a copy of the latest buffer in the stream."""
-        if self._latest_buffer is None:
-            return None
-        with self._latest_buffer_lock.gen_rlock():
-            b = self._latest_buffer[:]
-        return b
+        """Return the latest buffer in the stream.
+
+        The buffer is immutable, so it's returned without copying.
+        """
+        return self._latest_buffer
@@ -1,9 +1,7 @@
 """mqtt provides an MJPEG+MQTT API for camera supervision and interaction."""
 
 import json
-import os
 import threading
-import time
 import typing
 
 import loguru
@@ -11,7 +9,17 @@ import loguru
 from planktoscope import mqtt as messaging
 from planktoscope.camera import hardware, mjpeg
 
-loguru.logger.info("planktoscope.camera is loaded")
+loguru.logger.debug("planktoscope.camera is loaded")
+
+# Status updates which never change are serialized in advance, since Paho would otherwise have to
+# encode them as UTF-8 again for every message:
+_STATUS_SETTINGS_UPDATED = b'{"status":"Camera settings updated"}'
+_STATUS_SETTINGS_ERROR = b'{"status":"Camera settings error"}'
+
+_HARDWARE_CONFIG_PATH = "/home/pi/PlanktoScope/hardware.json"
+
+# How long to wait for more settings commands before applying the settings received so far, in sec:
+_SETTINGS_DEBOUNCE_DELAY = 0.05
 
 
 class Worker(threading.Thread):
@@ -50,19 +58,17 @@ class Worker(threading.Thread):
             sharpness=0,  # disable the default "normal" sharpening level
             jpeg_quality=95,  # maximize image quality
         )
-        if os.path.exists("/home/pi/PlanktoScope/hardware.json"):
-            # load hardware.json
-            with open("/home/pi/PlanktoScope/hardware.json", "r", encoding="utf-8") as config_file:
+        try:
+            with open(_HARDWARE_CONFIG_PATH, "r", encoding="utf-8") as config_file:
                 hardware_config = json.load(config_file)
-                loguru.logger.debug(
-                    f"Loaded hardware configuration file: {hardware_config}",
-                )
-                settings = settings.overlay(hardware.config_to_settings_values(hardware_config))
-        else:
+        except FileNotFoundError:
             loguru.logger.info(
                 "The hardware configuration file doesn't exist, using default settings: "
                 + f"{settings}"
             )
+        else:
+            loguru.logger.debug(f"Loaded hardware configuration file: {hardware_config}")
+            settings = settings.overlay(hardware.config_to_settings_values(hardware_config))
 
         # I/O
         self._preview_stream: hardware.PreviewStream = hardware.PreviewStream()
@@ -73,6 +79,14 @@ class Worker(threading.Thread):
         self._camera_checked = threading.Event()
         self._stop_event_loop = threading.Event()
 
+        # Settings updates
+        # Note: the PlanktoScope GUI sends a burst of settings commands whenever a slider
+        # is dragged, so we merge commands which arrive in quick succession and apply them to the
+        # camera together, after a short delay:
+        self._pending_settings_lock = threading.Lock()
+        self._pending_settings: typing.Optional[hardware.SettingsValues] = None
+        self._settings_timer: typing.Optional[threading.Timer] = None
+
     @loguru.logger.catch
     def run(self) -> None:
         """Start the camera and run the main event loop."""
@@ -89,23 +103,32 @@ class Worker(threading.Thread):
         self._camera_checked.set()
 
         default_iso = 150
+        sensor_name = self._camera.sensor_name
         loguru.logger.debug(f"Setting camera image gain for default ISO value of {default_iso}...")
         # 100 is the default calibration because that's what's used in the Pi Camera v1 Module, and
         # it's a round number:
-        calibration = ISO_CALIBRATIONS.get(self._camera.sensor_name, 100)
+        calibration = ISO_CALIBRATIONS.get(sensor_name, 100)
         changes = hardware.SettingsValues(image_gain=default_iso / calibration)
         try:
-            _validate_settings(changes)
-        except (TypeError, ValueError) as e:
+            self._camera.settings = changes
+        except ValueError as e:
             raise ValueError("Invalid default ISO") from e
-        self._camera.settings = changes
         loguru.logger.debug(
-            f"Set image gain to {changes.image_gain} for sensor {self._camera.sensor_name}!",
+            f"Set image gain to {changes.image_gain} for sensor {sensor_name}!",
         )
 
         loguru.logger.info("Starting the MJPEG streaming server...")
         streaming_server = mjpeg.StreamingServer(self._preview_stream, self._mjpeg_server_address)
-        streaming_thread = threading.Thread(target=streaming_server.serve_forever)
+        # Note: the server only notices a shutdown request once per poll interval, so we
+        # shorten it from the default of 0.5 sec to make shutdown faster:
+        # Note: the thread is a daemon so that it can't keep the process alive if this
+        # worker crashes before it can shut down the server:
+        streaming_thread = threading.Thread(
+            target=streaming_server.serve_forever,
+            kwargs={"poll_interval": 0.1},
+            name="camera-mjpeg-server",
+            daemon=True,
+        )
         streaming_thread.start()
 
         loguru.logger.info("Starting the MQTT backend...")
@@ -113,31 +136,37 @@ class Worker(threading.Thread):
         # removing the "settings" action from the "imager/image" route which is a breaking change
         # to the MQTT API, so we'll do this later.
         mqtt = messaging.MQTT_Client(topic="imager/image", name="imager_camera_client")
+        # Note: messages are handled directly in the MQTT client's network thread, as soon
+        # as they arrive, so this thread only needs to wait for the signal to shut down:
+        mqtt.client.message_callback_add("imager/image", self._handle_mqtt_message)
         # TODO(ethanjli): allow an MQTT client to trigger this broadcast with an MQTT command. This
         # requires modifying the MQTT API (by adding a new route), and we'll want to make the
         # Node-RED dashboard query that route at startup, so we'll do this later.
         mqtt.client.publish("status/imager", json.dumps({"camera_name": self._camera.camera_name}))
 
         try:
-            while not self._stop_event_loop.is_set():
-                if not mqtt.new_message_received():
-                    time.sleep(0.1)
-                    continue
-                loguru.logger.debug(mqtt.msg)
-                if (message := mqtt.msg) is None:
-                    continue
-                self._receive_message(message)
-                if (status_update := mqtt.read_message()) is not None:
-                    mqtt.client.publish("status/imager", status_update)
+            self._stop_event_loop.wait()
         finally:
-            loguru.logger.info("Stopping the MQTT API...")
+            loguru.logger.info("Stopping the MQTT API and the MJPEG streaming server...")
+            # Both of these block until their background threads notice that they should stop, so
+            # we wait for them concurrently rather than one after the other:
+            streaming_server_stopper = threading.Thread(
+                target=streaming_server.shutdown, name="camera-mjpeg-server-shutdown"
+            )
+            streaming_server_stopper.start()
             mqtt.shutdown()
-
-            loguru.logger.info("Stopping the MJPEG streaming server...")
-            streaming_server.shutdown()
+            streaming_server_stopper.join()
             streaming_server.server_close()
             streaming_thread.join()
 
+            # No more settings commands can arrive now, so we discard any which are still pending:
+            with self._pending_settings_lock:
+                settings_timer, self._settings_timer = self._settings_timer, None
+                self._pending_settings = None
+            if settings_timer is not None:
+                settings_timer.cancel()
+                settings_timer.join()
+
             loguru.logger.info("Stopping the camera...")
             self._camera.close()
             self._camera = None
@@ -145,35 +174,100 @@ class Worker(threading.Thread):
             loguru.logger.success("Done shutting down!")
 
     @loguru.logger.catch
-    def _receive_message(self, message: dict[str, typing.Any]) -> typing.Optional[str]:
-        """Handle a single MQTT message.
+    def _handle_mqtt_message(
+        self, client: typing.Any, _userdata: typing.Any, message: typing.Any
+    ) -> None:
+        """Handle a single MQTT message, as a Paho client message callback.
+
+        This callback is only registered for the "imager/image" topic, so the topic doesn't need to
+        be checked. Broadcasts any resulting status update.
+        """
+        payload = json.loads(message.payload)
+        loguru.logger.debug(f"{message.topic}: {payload}")
+        if payload.get("action", "") != "settings":
+            return
+        if (status_update := self._update_settings(payload, client)) is not None:
+            client.publish("status/imager", status_update)
 
-        Returns a status update to broadcast.
+    def _update_settings(
+        self, payload: dict[str, typing.Any], client: typing.Any
+    ) -> typing.Optional[bytes]:
+        """Handle a single "settings" command received over MQTT.
+
+        Valid settings aren't applied immediately; instead, they're merged with any other pending
+        settings, and all pending settings are applied together (with a status update broadcast over
+        the MQTT client) a short delay after the first command which arrived since the last update.
+
+        Returns:
+            A status update to broadcast immediately if the command is invalid, or `None` otherwise.
         """
         assert self._camera is not None
 
-        if message["topic"] != "imager/image" or message["payload"].get("action", "") != "settings":
-            return None
-        if "settings" not in message["payload"]:
-            loguru.logger.error(f"Received message is missing field 'settings': {message}")
-            return '{"status":"Camera settings error"}'
+        if "settings" not in payload:
+            loguru.logger.error(f"Received message is missing field 'settings': {payload}")
+            return _STATUS_SETTINGS_ERROR
+
+        settings = payload["settings"]
+        with self._pending_settings_lock:
+            pending = self._pending_settings
+            # Missing white-balance gains are taken from the latest requested gains, which might
+            # not have been applied to the camera yet:
+            white_balance_gains = self._camera.settings.white_balance_gains
+            if pending is not None and pending.white_balance_gains is not None:
+                white_balance_gains = pending.white_balance_gains
+            try:
+                converted_settings = _convert_settings(
+                    settings, white_balance_gains, self._camera.sensor_name
+                )
+            except (TypeError, ValueError) as e:
+                loguru.logger.exception(
+                    f"Couldn't convert MQTT command to hardware settings: {settings}",
+                )
+                return json.dumps({"status": f"Error: {str(e)}"}).encode()
 
-        loguru.logger.info("Updating camera settings...")
-        settings = message["payload"]["settings"]
-        try:
-            converted_settings = _convert_settings(
-                settings, self._camera.settings.white_balance_gains, self._camera.sensor_name
-            )
-            _validate_settings(converted_settings)
-        except (TypeError, ValueError) as e:
-            loguru.logger.exception(
-                f"Couldn't convert MQTT command to hardware settings: {settings}",
+            merged_settings = (
+                converted_settings if pending is None else pending.overlay(converted_settings)
             )
-            return json.dumps({"status": f"Error: {str(e)}"})
+            # The values were range-checked as they were converted, but some checks depend on
+            # other settings (e.g. exposure time vs. frame duration limits), so the command is
+            # checked against the settings it would result in; this way, an invalid command is
+            # rejected on its own, rather than causing the whole batch of pending settings to fail:
+            if errors := list(self._camera.settings.overlay(merged_settings).validate()):
+                loguru.logger.error(f"Invalid camera settings: {settings}: {errors}")
+                return json.dumps({"status": f"Error: {'; '.join(errors)}"}).encode()
+
+            loguru.logger.info("Queuing camera settings update...")
+            self._pending_settings = merged_settings
+            if self._settings_timer is None:
+                self._settings_timer = threading.Timer(
+                    _SETTINGS_DEBOUNCE_DELAY, self._apply_pending_settings, args=(client,)
+                )
+                self._settings_timer.name = "camera-settings-update"
+                self._settings_timer.start()
+        return None
 
-        self._camera.settings = converted_settings
-        loguru.logger.success("Updated camera settings!")
-        return '{"status":"Camera settings updated"}'
+    @loguru.logger.catch
+    def _apply_pending_settings(self, client: typing.Any) -> None:
+        """Apply all pending settings to the camera, and broadcast a status update."""
+        # Note: the settings are applied while holding the lock, so that the camera can't
+        # be closed (during shutdown) while they're being applied:
+        with self._pending_settings_lock:
+            pending, self._pending_settings = self._pending_settings, None
+            self._settings_timer = None
+            if pending is None:
+                return
+
+            assert self._camera is not None
+            loguru.logger.info("Updating camera settings...")
+            try:
+                self._camera.settings = pending
+            except ValueError as e:
+                loguru.logger.exception(f"Couldn't update camera settings: {pending}")
+                status_update = json.dumps({"status": f"Error: {str(e)}"}).encode()
+            else:
+                loguru.logger.success("Updated camera settings!")
+                status_update = _STATUS_SETTINGS_UPDATED
+        client.publish("status/imager", status_update)
 
     @property
     def camera(self) -> typing.Optional[hardware.PiCamera]:
@@ -210,34 +304,34 @@ def _convert_settings(
         All settings extracted from the MQTT command.
 
     Raises:
-        ValueError: at least one of the MQTT command settings is invalid.
+        ValueError: at least one of the MQTT command settings is invalid (e.g. out-of-range).
     """
     # TODO(ethanjli): separate out the status from the error message in the MQTT API, so
     # that we can just directly use the error messages from the
     # `hardware.SettingsValues.validate()` method. That would be simpler; for now we're
-    # trying to keep the MQTT API unchanged, so we return different ValueErrors.
-    converted = hardware.SettingsValues()
+    # trying to keep the MQTT API unchanged, so we check each value's range (as enforced by
+    # `hardware.SettingsValues.validate()`) as it's converted, and raise different ValueErrors.
+    # Note: the converted values are accumulated as keyword arguments so that only one
+    # SettingsValues needs to be constructed, rather than a new one for each converted setting.
+    converted: dict[str, typing.Any] = {}
     if "shutter_speed" in command_settings:
         try:
             exposure_time = int(command_settings["shutter_speed"])
         except (TypeError, ValueError) as e:
             raise ValueError("Shutter speed not valid") from e
-        converted = converted._replace(exposure_time=exposure_time)
-    converted = converted.overlay(
-        _convert_image_gain_settings(
-            command_settings,
-            camera_sensor_name,
-        )
-    )
+        if exposure_time < 0:
+            raise ValueError("Shutter speed not valid")
+        converted["exposure_time"] = exposure_time
+    converted.update(_convert_image_gain_settings(command_settings, camera_sensor_name))
     if "white_balance" in command_settings:
         if (awb := command_settings["white_balance"]) not in {"auto", "off"}:
             raise ValueError("White balance mode {awb} not valid")
-        converted = converted._replace(auto_white_balance=awb != "off")
-    converted = converted.overlay(
+        converted["auto_white_balance"] = awb != "off"
+    converted.update(
         _convert_white_balance_gain_settings(command_settings, default_white_balance_gains)
     )
 
-    return converted
+    return hardware.SettingsValues(**converted)
 
 
 # Refer to https://picamera.readthedocs.io/en/release-1.13/fov.html#sensor-gain for
@@ -253,19 +347,20 @@ ISO_CALIBRATIONS = {  # this is ISO / image-gain
 def _convert_image_gain_settings(
     command_settings: dict[str, typing.Any],
     camera_sensor_name: str,
-) -> hardware.SettingsValues:
+) -> dict[str, typing.Any]:
     """Convert image gains in MQTT command settings to camera hardware settings.
 
     Args:
         command_settings: the settings to convert.
 
     Returns:
-        Any image gain-related settings extracted from the MQTT command, but no other settings.
+        Any image gain-related settings extracted from the MQTT command, but no other settings, as
+        keyword arguments for `hardware.SettingsValues`.
 
     Raises:
         ValueError: at least one of the MQTT command settings is invalid.
     """
-    converted = hardware.SettingsValues()
+    converted: dict[str, typing.Any] = {}
     # TODO(ethanjli): now that we're using image_gain as the ISO, we should remove one of them
     # from the MQTT API (it could be better to keep ISO since it's tied to metadata, or it could
     # be better to remove ISO since ISO is a fictitious parameter (since the hardware doesn't
@@ -277,7 +372,7 @@ def _convert_image_gain_settings(
             image_gain = float(command_settings["image_gain"]["analog"])
         except (ValueError, KeyError) as e:
             raise ValueError("Image gain not valid") from e
-        converted = converted._replace(image_gain=image_gain)
+        converted["image_gain"] = image_gain
     if "iso" in command_settings:
         try:
             iso = float(command_settings["iso"])
@@ -286,8 +381,10 @@ def _convert_image_gain_settings(
         # 100 is the default calibration because that's what's used in the Pi Camera v1 Module, and
         # it's a round number:
         calibration = ISO_CALIBRATIONS.get(camera_sensor_name, 100)
-        converted = converted._replace(image_gain=iso / calibration)
+        converted["image_gain"] = iso / calibration
 
+    if "image_gain" in converted and not 0.0 <= converted["image_gain"] <= 16.0:
+        raise ValueError("Iso number not valid")
     return converted
 
 
@@ -299,7 +396,7 @@ def _convert_white_balance_gain_settings(
     # of previous white balance gains (which could be prone to getting into an inconsistent state
     # compared to the values shown in the GUI); we could maybe even delete this function afterwards.
     default_white_balance_gains: typing.Optional[hardware.WhiteBalanceGains],
-) -> hardware.SettingsValues:
+) -> dict[str, typing.Any]:
     """Convert white-balance gains in MQTT command settings to camera hardware settings.
 
     Args:
@@ -309,21 +406,21 @@ def _convert_white_balance_gain_settings(
 
     Returns:
         Any white balance gain-related settings extracted from the MQTT command, but no other
-        settings.
+        settings, as keyword arguments for `hardware.SettingsValues`.
 
     Raises:
         ValueError: at least one of the MQTT command settings is invalid.
     """
-    converted = hardware.SettingsValues()
     if "white_balance_gain" not in command_settings:
-        return converted
+        return {}
+    command_gains = command_settings["white_balance_gain"]
 
     # TODO(ethanjli): change the MQTT API use normal white-balance gains instead of the gains which
     # are multiplied by 100, since the PlanktoScope GUI shows them without the multiplication by 100
     # anyways. That will make the flow of values simpler and easier to follow, since we won't need
     # to transform them on both sides of the API.
     try:
-        red_gain = float(command_settings["white_balance_gain"]["red"]) / 100
+        red_gain = float(command_gains["red"]) / 100
     except (TypeError, ValueError) as e:
         raise ValueError("White balance gain not valid") from e
     except KeyError as e:
@@ -331,39 +428,13 @@ def _convert_white_balance_gain_settings(
             raise ValueError("White balance gain not valid") from e
         red_gain = default_white_balance_gains.red
     try:
-        blue_gain = float(command_settings["white_balance_gain"]["blue"]) / 100
+        blue_gain = float(command_gains["blue"]) / 100
     except (TypeError, ValueError) as e:
         raise ValueError("White balance gain not valid") from e
     except KeyError as e:
         if default_white_balance_gains is None:
             raise ValueError("White balance gain not valid") from e
         blue_gain = default_white_balance_gains.blue
-    return converted._replace(
-        white_balance_gains=hardware.WhiteBalanceGains(red=red_gain, blue=blue_gain)
-    )
-
-
-# TODO(ethanjli): separate out the status from the error message in the MQTT API, so
-# that we can just directly use the error messages from the `hardware.SettingsValues.validate()`
-# method, and then we can delete this function. That would be simpler; for now we're trying to keep
-# the MQTT API unchanged, so we have this wrapper to return different ValueErrors.
-def _validate_settings(settings: hardware.SettingsValues) -> None:
-    """Check validity of camera hardware settings.
-
-    Raises:
-        ValueError: at least one of the MQTT command settings is invalid.
-    """
-    if validation_errors := settings.validate():
-        loguru.logger.error(
-            f"Invalid camera settings requested: {'; '.join(validation_errors)}",
-        )
-        erroneous_field, _ = validation_errors[0].split(" out of range", 1)
-        error_message_mappings = {
-            "Exposure time": "Shutter speed",
-            "Image gain": "Iso number",
-            "Red white-balance gain": "White balance gain",
-            "Blue white-balance gain": "White balance gain",
-        }
-        raise ValueError(
-            f"{error_message_mappings.get(erroneous_field, erroneous_field)} not valid",
-        )
+    if not (0.0 <= red_gain <= 32.0 and 0.0 <= blue_gain <= 32.0):
+        raise ValueError("White balance gain not valid")
+    return {"white_balance_gains": hardware.WhiteBalanceGains(red=red_gain, blue=blue_gain)}
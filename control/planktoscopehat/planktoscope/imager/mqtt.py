@@ -2,11 +2,10 @@
 
 import datetime
 import json
-import multiprocessing
 import os
 import threading
-import time
 import typing
+from concurrent import futures
 
 import loguru
 
@@ -14,11 +13,26 @@ from planktoscope import identity, integrity, mqtt
 from planktoscope.camera import mqtt as camera
 from planktoscope.imager import stopflow
 
-loguru.logger.info("planktoscope.imager is loaded")
-
-
-# TODO(ethanjli): convert this from a process into a thread
-class Worker(multiprocessing.Process):
+loguru.logger.debug("planktoscope.imager is loaded")
+
+# Status updates which never change are serialized in advance, since Paho would otherwise have to
+# encode them as UTF-8 again for every message:
+_STATUS_STARTING_UP = b'{"status":"Starting up"}'
+_STATUS_MISSING_CAMERA = b'{"status": "Error: missing camera"}'
+_STATUS_READY = b'{"status":"Ready"}'
+_STATUS_DEAD = b'{"status":"Dead"}'
+_STATUS_BUSY = b'{"status":"Busy"}'
+_STATUS_CONFIG_MESSAGE_ERROR = b'{"status":"Configuration message error"}'
+_STATUS_CONFIG_UPDATED = b'{"status":"Config updated"}'
+_STATUS_ERROR = b'{"status":"Error"}'
+_STATUS_STARTED = b'{"status":"Started"}'
+_STATUS_INTERRUPTED = b'{"status":"Interrupted"}'
+_STATUS_DONE = b'{"status":"Done"}'
+# The same goes for commands to the pump which never change:
+_PUMP_STOP_COMMAND = b'{"action": "stop"}'
+
+
+class Worker(threading.Thread):
     """An MQTT+MJPEG API for the PlanktoScope's camera and image acquisition modules.
 
     This launches the camera with an MQTT API for settings adjustments and an MJPEG server with a
@@ -42,7 +56,14 @@ class Worker(multiprocessing.Process):
         # Internal state
         self._stop_event_loop = stop_event
         self._metadata: dict[str, typing.Any] = {}
+        self._machine_name: typing.Optional[str] = None
         self._active_routine: typing.Optional[ImageAcquisitionRoutine] = None
+        # Handlers for commands received over MQTT, keyed by action:
+        self._action_handlers: dict[str, typing.Callable[[dict[str, typing.Any]], None]] = {
+            "update_config": self._update_metadata,
+            "image": self._start_acquisition,
+            "stop": self._stop_acquisition,
+        }
 
         # I/O
         self._mqtt: typing.Optional[mqtt.MQTT_Client] = None
@@ -66,7 +87,7 @@ class Worker(multiprocessing.Process):
             f"The imager control thread has been started in process {os.getpid()}"
         )
         self._mqtt = mqtt.MQTT_Client(topic="imager/#", name="imager_client")
-        self._mqtt.client.publish("status/imager", '{"status":"Starting up"}')
+        self._mqtt.client.publish("status/imager", _STATUS_STARTING_UP)
 
         loguru.logger.info("Starting the pump RPC client...")
         self._pump = _PumpClient()
@@ -81,9 +102,7 @@ class Worker(multiprocessing.Process):
                 "Missing camera - maybe it's disconnected or it never started?"
             )
             # TODO(ethanjli): officially add this error status to the MQTT API!
-            self._mqtt.client.publish(
-                "status/imager", '{"status": "Error: missing camera"}'
-            )
+            self._mqtt.client.publish("status/imager", _STATUS_MISSING_CAMERA)
             loguru.logger.success(
                 "Preemptively preparing to shut down since there's no camera..."
             )
@@ -96,11 +115,11 @@ class Worker(multiprocessing.Process):
             # and return early here.
             loguru.logger.success("Waiting for a shutdown signal...")
             self._stop_event_loop.wait()
-            loguru.logger.success("Imager process shut down!")
+            loguru.logger.success("Imager thread shut down!")
             return
 
         loguru.logger.success("Camera is ready!")
-        self._mqtt.client.publish("status/imager", '{"status":"Ready"}')
+        self._mqtt.client.publish("status/imager", _STATUS_READY)
         try:
             while not self._stop_event_loop.is_set():
                 if (
@@ -112,15 +131,18 @@ class Worker(multiprocessing.Process):
                     self._active_routine.stop()
                     self._active_routine = None
 
-                if not self._mqtt.new_message_received():
-                    time.sleep(0.1)
+                # Note: we wake up as soon as a message arrives, and the timeout only
+                # bounds how long it takes to notice that the event loop should stop, which must
+                # stay well below the timeout with which the hardware controller joins the imager
+                # thread during shutdown:
+                if not self._mqtt.wait_for_message(timeout=1.0):
                     continue
                 self._handle_new_message()
         finally:
-            loguru.logger.info("Shutting down the imager process...")
-            self._mqtt.client.publish("status/imager", '{"status":"Dead"}')
+            loguru.logger.info("Shutting down the imager thread...")
+            self._mqtt.client.publish("status/imager", _STATUS_DEAD)
             self._cleanup()
-            loguru.logger.success("Imager process shut down!")
+            loguru.logger.success("Imager thread shut down!")
 
     def _cleanup(self) -> None:
         """Clean up everything running in the background."""
@@ -149,16 +171,20 @@ class Worker(multiprocessing.Process):
         latest_message = self._mqtt.msg["payload"]
         action = self._mqtt.msg["payload"]["action"]
         self._mqtt.read_message()
-        if action == "update_config":
-            self._update_metadata(latest_message)
-        elif action == "image":
-            try:
-                self._start_acquisition(latest_message)
-            except RuntimeError:
-                loguru.logger.exception("Couldn't start image acquisition!")
-        elif action == "stop" and self._active_routine is not None:
-            self._active_routine.stop()
-            self._active_routine = None
+        if (handler := self._action_handlers.get(action)) is None:
+            return
+        try:
+            handler(latest_message)
+        except RuntimeError:
+            loguru.logger.exception(f"Couldn't handle the {action} command!")
+
+    def _stop_acquisition(self, _latest_message: dict[str, typing.Any]) -> None:
+        """Handle a new imager command to stop image acquisition, if it's running."""
+        if self._active_routine is None:
+            return
+
+        self._active_routine.stop()
+        self._active_routine = None
 
     def _update_metadata(self, latest_message: dict[str, typing.Any]) -> None:
         """Handle a new imager command to update the configuration (i.e. the metadata)."""
@@ -170,21 +196,19 @@ class Worker(multiprocessing.Process):
         # action), so we'll do it later.
         if self._active_routine is not None and self._active_routine.is_alive():
             loguru.logger.error("Can't update configuration during image acquisition!")
-            self._mqtt.client.publish("status/imager", '{"status":"Busy"}')
+            self._mqtt.client.publish("status/imager", _STATUS_BUSY)
             return
 
         if "config" not in latest_message:
             loguru.logger.error(
                 f"Received message is missing field 'config': {latest_message}"
             )
-            self._mqtt.client.publish(
-                "status/imager", '{"status":"Configuration message error"}'
-            )
+            self._mqtt.client.publish("status/imager", _STATUS_CONFIG_MESSAGE_ERROR)
             return
 
         loguru.logger.info("Updating configuration...")
         self._metadata = latest_message["config"]
-        self._mqtt.client.publish("status/imager", '{"status":"Config updated"}')
+        self._mqtt.client.publish("status/imager", _STATUS_CONFIG_UPDATED)
         loguru.logger.success("Updated configuration!")
 
     def _start_acquisition(self, latest_message: dict[str, typing.Any]) -> None:
@@ -196,14 +220,12 @@ class Worker(multiprocessing.Process):
         if (
             acquisition_settings := _parse_acquisition_settings(latest_message)
         ) is None:
-            self._mqtt.client.publish("status/imager", '{"status":"Error"}')
+            self._mqtt.client.publish("status/imager", _STATUS_ERROR)
             return
         if self._camera.camera is None:
             loguru.logger.error("Missing camera - maybe it was closed?")
             # TODO(ethanjli): officially add this error status to the MQTT API!
-            self._mqtt.client.publish(
-                "status/imager", '{"status": "Error: missing camera"}'
-            )
+            self._mqtt.client.publish("status/imager", _STATUS_MISSING_CAMERA)
             raise RuntimeError("Camera is not available")
 
         assert (
@@ -211,7 +233,11 @@ class Worker(multiprocessing.Process):
         ) is not None
         camera_settings = self._camera.camera.settings
         assert (image_gain := camera_settings.image_gain) is not None
-        machine_name = identity.load_machine_name()
+        if self._machine_name is None:
+            # The machine name can't change while the PlanktoScope is running, so it only needs to
+            # be loaded once:
+            self._machine_name = identity.load_machine_name()
+        machine_name = self._machine_name
         metadata = {
             **self._metadata,
             "acq_local_datetime": datetime.datetime.now().isoformat().split(".")[0],
@@ -321,11 +347,12 @@ def _initialize_acquisition_directory(
         str(metadata["sample_id"]).replace(" ", "_").strip("'"),
         str(metadata["acq_id"]).replace(" ", "_").strip("'"),
     )
-    if os.path.exists(acq_dir_path):
+    try:
+        os.makedirs(acq_dir_path)
+    except FileExistsError as e:
         loguru.logger.error(f"Acquisition directory {acq_dir_path} already exists!")
-        raise ValueError("Chosen id are already in use!")
+        raise ValueError("Chosen id are already in use!") from e
 
-    os.makedirs(acq_dir_path)
     loguru.logger.info("Saving metadata...")
     metadata_filepath = os.path.join(acq_dir_path, "metadata.json")
     with open(metadata_filepath, "w", encoding="utf-8") as metadata_file:
@@ -351,42 +378,93 @@ class ImageAcquisitionRoutine(threading.Thread):
             routine: the image-acquisition routine to run.
             mqtt_client: an MQTT client which will be used to broadcast updates.
         """
-        super().__init__()
+        super().__init__(name="image-acquisition")
         self._routine = routine
         self._mqtt_client = mqtt_client.client
 
     def run(self) -> None:
         """Run a stop-flow image-acquisition routine until completion or interruption."""
-        self._mqtt_client.publish("status/imager", '{"status":"Started"}')
-        while True:
-            if (result := self._routine.run_step()) is None:
-                if self._routine.interrupted:
-                    loguru.logger.debug("Image-acquisition routine was interrupted!")
-                    self._mqtt_client.publish(
-                        "status/imager", '{"status":"Interrupted"}'
-                    )
+        self._mqtt_client.publish("status/imager", _STATUS_STARTED)
+        # Note: saving an image and adding it to the integrity file require encoding,
+        # writing, reading & hashing the whole image, so we do it in the background while the next
+        # step starts running the pump; images are still recorded one at a time, in order. The
+        # integrity file is kept open for the whole routine, rather than being re-opened for every
+        # image:
+        integrity_filepath = os.path.join(self._routine.output_path, integrity.integrity_file_name)
+        with open(integrity_filepath, "a", encoding="utf-8") as integrity_file, (
+            futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="image-acquisition-integrity"
+            )
+        ) as recorder:
+            recording: typing.Optional["futures.Future[bool]"] = None
+            while True:
+                result = self._routine.run_step()
+                if recording is not None and not recording.result():
                     break
-                loguru.logger.debug("Image-acquisition routine ran to completion!")
-                self._mqtt_client.publish("status/imager", '{"status":"Done"}')
-                break
-
-            index, filename = result
-            filename_path = os.path.join(self._routine.output_path, filename)
-            try:
-                integrity.append_to_integrity_file(filename_path)
-            except FileNotFoundError:
-                self._mqtt_client.publish(
-                    "status/imager",
-                    f'{{"status":"Image {index + 1}/{self._routine.settings.total_images} '
-                    + 'WAS NOT CAPTURED! STOPPING THE PROCESS!"}}',
+                if result is None:
+                    # Each image was already flushed to storage as it was recorded, but the
+                    # integrity file wasn't:
+                    integrity_file.flush()
+                    os.sync()
+                    if self._routine.interrupted:
+                        loguru.logger.debug("Image-acquisition routine was interrupted!")
+                        self._mqtt_client.publish("status/imager", _STATUS_INTERRUPTED)
+                        break
+                    loguru.logger.debug("Image-acquisition routine ran to completion!")
+                    self._mqtt_client.publish("status/imager", _STATUS_DONE)
+                    break
+
+                index, filename, saved = result
+                recording = recorder.submit(
+                    self._record_image, integrity_file, index, filename, saved
                 )
-                break
 
+    def _record_image(
+        self,
+        integrity_file: typing.TextIO,
+        index: int,
+        filename: str,
+        saved: "futures.Future[None]",
+    ) -> bool:
+        """Record an acquired image once it's saved, and broadcast a status update.
+
+        Recording the image flushes it to storage and adds it to the integrity file. If the image
+        couldn't be taken or saved, or if it's missing, the routine is stopped.
+
+        Args:
+            integrity_file: the routine's integrity file, already opened for appending.
+            index: the index of the image in the routine.
+            filename: the name of the image file in the routine's output directory.
+            saved: a future which completes once the image has been saved.
+
+        Returns:
+            Whether the image was successfully recorded.
+        """
+        filename_path = os.path.join(self._routine.output_path, filename)
+        try:
+            # Note: any error from taking or saving the image (e.g. a camera failure, or a full
+            # disk) is re-raised here; it must not escape, or it would kill this thread without
+            # any status update:
+            saved.result()
+            _sync_new_file(filename_path)
+            integrity.append_to_integrity_fh(integrity_file, filename_path)
+        except Exception:  # pylint: disable=broad-exception-caught
+            loguru.logger.exception(f"Couldn't record image {filename_path}")
             self._mqtt_client.publish(
                 "status/imager",
                 f'{{"status":"Image {index + 1}/{self._routine.settings.total_images} '
-                + f'saved to {filename}"}}',
+                + 'WAS NOT CAPTURED! STOPPING THE PROCESS!"}}',
             )
+            # This interrupts the step which is already running, if there is one:
+            self._routine.stop()
+            return False
+
+        self._mqtt_client.publish(
+            "status/imager",
+            f'{{"status":"Image {index + 1}/{self._routine.settings.total_images} '
+            + f'saved to {filename}"}}',
+        )
+        return True
 
     def stop(self) -> None:
         """Stop the thread.
@@ -400,6 +478,24 @@ class ImageAcquisitionRoutine(threading.Thread):
         self.join()
 
 
+def _sync_new_file(path: str) -> None:
+    """Flush a newly-written file, and its entry in its parent directory, to storage.
+
+    Unlike `os.sync()`, this doesn't also flush every other pending write in every filesystem, which
+    can take a long time on an SD card. Does nothing if the file doesn't exist, since checking that
+    the file was actually saved is the responsibility of the caller.
+    """
+    for sync_path, sync in ((path, os.fdatasync), (os.path.dirname(path), os.fsync)):
+        try:
+            fd = os.open(sync_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return
+        try:
+            sync(fd)
+        finally:
+            os.close(fd)
+
+
 # TODO(ethanjli): rearchitect the hardware controller so that the imager can directly call pump
 # methods (by running all modules in the same process), so that we can just delete this entire class
 # and simplify function calls between the imager and the pump! This will require launching the
@@ -414,48 +510,37 @@ class _PumpClient:
         # from a separate thread, and currently the MQTT client isn't thread-safe (it deadlocks
         # if we don't have a separate MQTT client):
         self._mqtt: typing.Optional[mqtt.MQTT_Client] = None
-        self._mqtt_receiver_thread: typing.Optional[threading.Thread] = None
-        self._stop_receiving_mqtt = threading.Event()  # close() was called
         self._done = threading.Event()  # run_discrete() finished or stop() was called
         self._discrete_run = threading.Lock()  # mutex on starting the pump
 
     def open(self) -> None:
         """Start the pump MQTT client.
 
-        Launches a thread to listen for MQTT updates from the pump. After this method is called,
-        the `run_discrete()` and `stop()` methods can be called.
+        Pump status updates are handled by the MQTT client's network thread as soon as they
+        arrive. After this method is called, the `run_discrete()` and `stop()` methods can be
+        called.
         """
         if self._mqtt is not None:
             return
 
         self._mqtt = mqtt.MQTT_Client(topic="status/pump", name="imager_pump_client")
-        self._mqtt_receiver_thread = threading.Thread(target=self._receive_messages)
-        self._mqtt_receiver_thread.start()
-
-    def _receive_messages(self) -> None:
-        """Update internal state based on pump status updates received over MQTT."""
-        assert self._mqtt is not None
-
-        while not self._stop_receiving_mqtt.is_set():
-            if not self._mqtt.new_message_received():
-                time.sleep(0.1)
-                continue
-            if self._mqtt.msg is None or self._mqtt.msg["topic"] != "status/pump":
-                continue
+        self._mqtt.client.message_callback_add("status/pump", self._handle_status_update)
 
-            if self._mqtt.msg["payload"]["status"] not in {"Done", "Interrupted"}:
-                loguru.logger.debug(
-                    f"Ignoring pump status update: {self._mqtt.msg['payload']}"
-                )
-                self._mqtt.read_message()
-                continue
+    @loguru.logger.catch
+    def _handle_status_update(
+        self, client: typing.Any, _userdata: typing.Any, message: typing.Any
+    ) -> None:
+        """Update internal state based on a pump status update, as a Paho message callback."""
+        payload = json.loads(message.payload)
+        if payload["status"] not in {"Done", "Interrupted"}:
+            loguru.logger.debug(f"Ignoring pump status update: {payload}")
+            return
 
-            loguru.logger.debug(f"The pump has stopped: {self._mqtt.msg['payload']}")
-            self._mqtt.client.unsubscribe("status/pump")
-            self._mqtt.read_message()
-            self._done.set()
-            if self._discrete_run.locked():
-                self._discrete_run.release()
+        loguru.logger.debug(f"The pump has stopped: {payload}")
+        client.unsubscribe("status/pump")
+        self._done.set()
+        if self._discrete_run.locked():
+            self._discrete_run.release()
 
     def run_discrete(self, settings: stopflow.DiscretePumpSettings) -> None:
         """Run the pump for a discrete volume at the specified flow rate and direction.
@@ -472,7 +557,7 @@ class _PumpClient:
             raise RuntimeError("MQTT client was not initialized yet!")
 
         # We ignore the pylint error here because the lock can only be released from a different
-        # thread (the thread which calls the `handle_status_update()` method):
+        # thread (the thread which calls the `_handle_status_update()` method):
         self._discrete_run.acquire()  # pylint: disable=consider-using-with
         self._done.clear()
         self._mqtt.client.subscribe("status/pump")
@@ -495,21 +580,17 @@ class _PumpClient:
             raise RuntimeError("MQTT client was not initialized yet!")
 
         self._mqtt.client.subscribe("status/pump")
-        self._mqtt.client.publish("actuator/pump", '{"action": "stop"}')
+        self._mqtt.client.publish("actuator/pump", _PUMP_STOP_COMMAND)
 
     def close(self) -> None:
         """Close the pump MQTT client, if it's currently open.
 
-        Stops the MQTT receiver thread and blocks until it finishes. After this method is called,
-        no methods are allowed to be called.
+        Stops the MQTT client's network thread and blocks until it finishes. After this method is
+        called, no methods are allowed to be called.
         """
         if self._mqtt is None:
             return
 
-        self._stop_receiving_mqtt.set()
-        if self._mqtt_receiver_thread is not None:
-            self._mqtt_receiver_thread.join()
-        self._mqtt_receiver_thread = None
         self._mqtt.shutdown()
         self._mqtt = None
 
@@ -15,6 +15,23 @@ from loguru import logger
 
 integrity_file_name = "integrity.check"
 
+# Files are hashed in large chunks, since each read and update has a fixed overhead in Python
+chunk_size = 1024 * 1024
+
+
+def _update_with_file_content(checksum, filepath):
+    """updates the checksum with the content of the file
+
+    Args:
+        checksum (hashlib hash object): checksum to update
+        filepath (string): file name of the file to read
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(filepath, "rb") as f:
+        while size := f.readinto(buffer):
+            checksum.update(view[:size])
+
 
 def get_checksum(filepath):
     """returns the sha1 checksum of the file
@@ -33,13 +50,7 @@ def get_checksum(filepath):
 
     # since we are just doing integrity verification, we can use an "insecure" hashing algorithm. If it's good for git, it's good for us.
     sha1 = hashlib.sha1()  # nosec
-    with open(filepath, "rb") as f:
-        while True:
-            # Let's read chunks in the algorithm block size we use
-            chunk = f.read(sha1.block_size)
-            if not chunk:
-                break
-            sha1.update(chunk)
+    _update_with_file_content(sha1, filepath)
 
     return sha1.hexdigest()
 
@@ -63,13 +74,7 @@ def get_filename_checksum(filepath):
     sha1 = hashlib.sha1()  # nosec
     sha1.update(os.path.split(filepath)[1].encode())
     sha1.update("\00".encode())
-    with open(filepath, "rb") as f:
-        while True:
-            # Let's read chunks in the algorithm block size we use
-            chunk = f.read(sha1.block_size)
-            if not chunk:
-                break
-            sha1.update(chunk)
+    _update_with_file_content(sha1, filepath)
 
     return sha1.hexdigest()
 
@@ -119,9 +124,25 @@ def append_to_integrity_file(filepath):
         create_integrity_file(os.path.dirname(filepath))
 
     with open(integrity_file_path, "a") as file:
-        file.write(
-            f"{os.path.split(filepath)[1]},{os.path.getsize(filepath)},{get_filename_checksum(filepath)}\n"
-        )
+        append_to_integrity_fh(file, filepath)
+
+
+def append_to_integrity_fh(file, filepath):
+    """Append the information about a filename to an integrity file which is already open
+
+    This avoids re-opening the integrity file for each file added to it.
+
+    Args:
+        file (file object): integrity file, opened for appending
+        filepath (string): path of the file to add to the integrity file
+    """
+    if not os.path.exists(filepath):
+        logger.error(f"The file at {filepath} does not exists!")
+        raise FileNotFoundError
+
+    file.write(
+        f"{os.path.split(filepath)[1]},{os.path.getsize(filepath)},{get_filename_checksum(filepath)}\n"
+    )
 
 
 def scan_path_to_integrity(path):
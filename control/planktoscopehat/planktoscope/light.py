@@ -57,6 +57,9 @@ class i2c_led:
         self.UVLO = False
         self.flash_timeout = False
         self.IVFM = False
+        # The bus is kept open for the lifetime of the controller, instead of reopening
+        # /dev/i2c-1 for every register access
+        self._bus = smbus.SMBus(1)
         RPi.GPIO.setwarnings(False)
         RPi.GPIO.setmode(RPi.GPIO.BCM)
         RPi.GPIO.setup(self.LED_selectPin, RPi.GPIO.OUT)
@@ -164,14 +167,14 @@ class i2c_led:
         self._write_byte(self.Register.enable, 0b00)
         self.off = False
 
+    def close(self):
+        self._bus.close()
+
     def _write_byte(self, address, data):
-        with smbus.SMBus(1) as bus:
-            bus.write_byte_data(self.DEVICE_ADDRESS, address, data)
+        self._bus.write_byte_data(self.DEVICE_ADDRESS, address, data)
 
     def _read_byte(self, address):
-        with smbus.SMBus(1) as bus:
-            b = bus.read_byte_data(self.DEVICE_ADDRESS, address)
-        return b
+        return self._bus.read_byte_data(self.DEVICE_ADDRESS, address)
 
 
 class pwm_led:
@@ -393,6 +396,7 @@ class LightProcess(multiprocessing.Process):
         self.led.set_torch_current(1)
         self.led.set_flash_current(1)
         self.led.get_flags()
+        self.led.close()
         RPi.GPIO.cleanup()
         self.light_client.client.publish("status/light", '{"status":"Dead"}')
         self.light_client.shutdown()
@@ -415,4 +419,5 @@ if __name__ == "__main__":
     led.set_torch_current(1)
     led.set_flash_current(1)
     led.get_flags()
+    led.close()
     RPi.GPIO.cleanup()
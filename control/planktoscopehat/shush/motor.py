@@ -2,8 +2,57 @@ __author__ = "ZJAllen"
 
 from shush.board import Board, s1, gpio
 from shush.drivers import tmc5160_reg as reg
+import ctypes
+import fcntl
+import struct
 import time
 
+# TMC5160 SPI datagram: 8-bit address followed by 32-bit big-endian data
+_DATAGRAM = struct.Struct(">BI")
+# reset_flag bit of the SPI status byte returned with every datagram, which mirrors GSTAT.reset
+_SPI_STATUS_RESET_FLAG = 0x01
+
+
+class _SpiIocTransfer(ctypes.Structure):
+    # struct spi_ioc_transfer from <linux/spi/spidev.h>
+    _fields_ = [
+        ("tx_buf", ctypes.c_uint64),
+        ("rx_buf", ctypes.c_uint64),
+        ("len", ctypes.c_uint32),
+        ("speed_hz", ctypes.c_uint32),
+        ("delay_usecs", ctypes.c_uint16),
+        ("bits_per_word", ctypes.c_uint8),
+        ("cs_change", ctypes.c_uint8),
+        ("tx_nbits", ctypes.c_uint8),
+        ("rx_nbits", ctypes.c_uint8),
+        ("word_delay_usecs", ctypes.c_uint8),
+        ("pad", ctypes.c_uint8),
+    ]
+
+
+def _spi_ioc_message(count: int) -> int:
+    # SPI_IOC_MESSAGE(count), i.e. _IOW(SPI_IOC_MAGIC, 0, char[SPI_MSGSIZE(count)])
+    return (1 << 30) | ((count * ctypes.sizeof(_SpiIocTransfer)) << 16) | (ord("k") << 8)
+
+
+# Write datagrams for the default driver configuration, packed once at import since the values
+# never change
+_DEFAULT_CONFIG_DATAGRAMS = tuple(
+    _DATAGRAM.pack(address | 0x80, data)
+    for address, data in (
+        # MULTISTEP_FILT = 1, EN_PWM_MODE = 1 enables stealthChop
+        (reg.GCONF, 0b0000000000001110),
+        # TOFF = 3, HSTRT = 4, HEND = 1, TBL = 2, CHM = 0 (spreadCycle)
+        (reg.CHOPCONF, 0x000100C3),
+        # IHOLD = 1, IRUN = 5 (max current), IHOLDDELAY = 8
+        (reg.IHOLD_IRUN, 0x00080501),
+        # TPOWERDOWN = 10: Delay before powerdown in standstill
+        (reg.TPOWERDOWN, 0x0000000A),
+        # TPWMTHRS = 500
+        (reg.TPWMTHRS, 0x000001F4),
+    )
+)
+
 
 class Motor(Board):
     def __init__(self, motor: int):
@@ -18,6 +67,16 @@ class Motor(Board):
             self.enable = s1.m1_enable
             self.spi = Board.spi1
 
+        # Last value written to RAMPMODE, so that go_to only switches modes when needed
+        self.__ramp_mode = None
+        # Set when VMAX/AMAX were written without going through the ramp properties, in which
+        # case the chip no longer holds the cached value of that ramp parameter
+        self.__ramp_VMAX_stale = False
+        self.__ramp_AMAX_stale = False
+        # Note: these only mirror the chip's registers; they are invalidated whenever the chip
+        # reports that it was reset (e.g. after a brown-out) and whenever the motor is released,
+        # so that go_to then writes the ramp mode and parameters again.
+
         # Initially apply default settings.
         # These can be configured at any time.
         self.default_settings()
@@ -29,25 +88,22 @@ class Motor(Board):
     def disable_motor(self):
         # Pull Enable pin HIGH to disable motor
         gpio.output(self.enable, gpio.HIGH)
+        self.__invalidate_ramp_state()
+
+    def __invalidate_ramp_state(self):
+        # Forget which ramp mode and parameters are on the chip
+        self.__ramp_mode = None
+        self.__ramp_VMAX_stale = True
+        self.__ramp_AMAX_stale = True
 
     def default_settings(self):
         # Set default motor parameters
-
-        # MULTISTEP_FILT = 1, EN_PWM_MODE = 1 enables stealthChop
-        self.write(reg.GCONF, 0b0000000000001110)
-        # TOFF = 3, HSTRT = 4, HEND = 1, TBL = 2, CHM = 0 (spreadCycle)
-        self.write(reg.CHOPCONF, 0x000100C3)
-        # IHOLD = 1, IRUN = 5 (max current), IHOLDDELAY = 8
-        self.write(reg.IHOLD_IRUN, 0x00080501)
-        # TPOWERDOWN = 10: Delay before powerdown in standstill
-        self.write(reg.TPOWERDOWN, 0x0000000A)
-        # TPWMTHRS = 500
-        self.write(reg.TPWMTHRS, 0x000001F4)
+        self.send_many(_DEFAULT_CONFIG_DATAGRAMS)
 
         self.reset_ramp_defaults()
 
         # Position mode
-        self.write(reg.RAMPMODE, 0)
+        self.position_mode()
         # Set current position to 0
         self.write(reg.XACTUAL, 0)
         # Set XTARGET to 0, which holds the motor at the current position
@@ -129,6 +185,8 @@ class Motor(Board):
         self.__ramp_VSTOP = value
 
     def write_ramp_params(self):
+        self.__ramp_VMAX_stale = False
+        self.__ramp_AMAX_stale = False
         self.ramp_VSTART = self.ramp_VSTART
         self.ramp_A1 = self.ramp_A1
         self.ramp_V1 = self.ramp_V1
@@ -209,10 +267,15 @@ class Motor(Board):
 
     def go_to(self, position: int):
         # Move to an absolute position relative to Home (0).
+        # The ramp generator of the TMC5160 produces the step pulses, so a move is only a few
+        # register writes; the ramp parameters are already on the chip (the ramp properties write
+        # through), so they are only re-sent after move_velocity has overwritten them.
 
-        self.position_mode()
+        if self.__ramp_mode != 0:
+            self.position_mode()
 
-        self.write_ramp_params()
+        if self.__ramp_VMAX_stale or self.__ramp_AMAX_stale:
+            self.write_ramp_params()
 
         # Position range is from -2^31 to +(2^31)-1
         maximum_position = (2 ** 31) - 1
@@ -312,9 +375,11 @@ class Motor(Board):
 
         if v_max is not None:
             self.write(reg.VMAX, v_max)
+            self.__ramp_VMAX_stale = True
 
         if a_max is not None:
             self.write(reg.AMAX, a_max)
+            self.__ramp_AMAX_stale = True
 
         if dir == 0:
             velocity_mode = 1
@@ -328,6 +393,7 @@ class Motor(Board):
 
         if not error:
             self.write(reg.RAMPMODE, velocity_mode)
+            self.__ramp_mode = velocity_mode
 
     def stop_motor(self):
         # Stop all motion. Keep motor enabled.
@@ -336,13 +402,18 @@ class Motor(Board):
         while self.get_velocity() != 0:
             time.sleep(0.01)
         self.hold_mode()
+        # Stopping only overwrote VMAX, so restore it; AMAX stays stale if an earlier
+        # move_velocity overwrote it, so that go_to still re-sends the ramp parameters
         self.ramp_VMAX = self.ramp_VMAX
+        self.__ramp_VMAX_stale = False
 
     def hold_mode(self):
         self.write(reg.RAMPMODE, 3)
+        self.__ramp_mode = 3
 
     def position_mode(self):
         self.write(reg.RAMPMODE, 0)
+        self.__ramp_mode = 0
 
     def get_ramp_status(self):
         self.read(reg.RAMPSTAT)
@@ -371,46 +442,38 @@ class Motor(Board):
     def read(self, address: int) -> int:
         # Read data from the SPI bus.
 
-        # Pre-populate data buffer with an empty array/list
-        address_buffer = [0] * 5
-        read_buffer = [0] * 5
-
-        # Clear write bit
-        address_buffer[0] = address & 0x7F
-
-        self.send_data(address_buffer)
+        # Clear write bit; it will look like [address, 0, 0, 0, 0]
+        address_buffer = _DATAGRAM.pack(address & 0x7F, 0)
 
-        # It will look like [address, 0, 0, 0, 0]
+        # The data for a read request is only returned with the following datagram
+        self.__check_status(self.send_data(address_buffer))
         read_buffer = self.send_data(address_buffer)
+        self.__check_status(read_buffer)
 
-        # Parse data returned from SPI transfer/read
-        value = read_buffer[1]
-        value = value << 8
-        value |= read_buffer[2]
-        value = value << 8
-        value |= read_buffer[3]
-        value = value << 8
-        value |= read_buffer[4]
+        # Parse data returned from SPI transfer/read, skipping the status byte
+        _, value = _DATAGRAM.unpack(bytes(read_buffer))
 
         return value
 
     def write(self, address: int, data: int) -> int:
         # Write data to the SPI bus.
 
-        # Pre-populate data buffer with an empty array/list
-        write_buffer = [0] * 5
+        # Pack the whole 40-bit datagram in one go: for write access, add 0x80 to address, then
+        # the 32-bit data (two's complement for negative values) in big-endian order
+        response = self.send_data(_DATAGRAM.pack(address | 0x80, data & 0xFFFFFFFF))
+        self.__check_status(response)
+        return response
 
-        # For write access, add 0x80 to address
-        write_buffer[0] = address | 0x80
+    def __check_status(self, response) -> None:
+        # Check the SPI status byte of a response for a reset of the chip.
 
-        write_buffer[1] = 0xFF & (data >> 24)
-        write_buffer[2] = 0xFF & (data >> 16)
-        write_buffer[3] = 0xFF & (data >> 8)
-        write_buffer[4] = 0xFF & data
+        if response[0] & _SPI_STATUS_RESET_FLAG:
+            self.__invalidate_ramp_state()
+            # Clear GSTAT.reset (write 1 to clear) so that the reset is only handled once; this
+            # goes through send_data, since its own response still has the reset flag set
+            self.send_data(_DATAGRAM.pack(reg.GSTAT | 0x80, _SPI_STATUS_RESET_FLAG))
 
-        return self.send_data(write_buffer)
-
-    def send_data(self, data_array: list) -> int:
+    def send_data(self, data_array) -> int:
         # Send data (read/write) over the SPI bus.
         # Pulls CS Low, transfers data array, then pulls CS High
 
@@ -425,6 +488,24 @@ class Motor(Board):
 
         # return response
 
+    def send_many(self, datagrams) -> None:
+        # Send several write datagrams with a single syscall.
+        # Each datagram is its own SPI transfer and CS is released between them (cs_change),
+        # since the TMC5160 only latches a datagram on the rising edge of CS; the responses are
+        # discarded.
+
+        tx_buffers = [ctypes.create_string_buffer(bytes(d), len(d)) for d in datagrams]
+        transfers = (_SpiIocTransfer * len(tx_buffers))()
+        for i, tx_buffer in enumerate(tx_buffers):
+            transfers[i].tx_buf = ctypes.addressof(tx_buffer)
+            transfers[i].len = len(tx_buffer)
+            transfers[i].speed_hz = self.spi.max_speed_hz
+            transfers[i].bits_per_word = 8
+            # On the last transfer, cs_change would instead keep CS asserted afterwards
+            transfers[i].cs_change = 1 if i < len(tx_buffers) - 1 else 0
+
+        fcntl.ioctl(self.spi.fileno(), _spi_ioc_message(len(tx_buffers)), transfers)
+
     def twos_comp(self, value: int, bits: int = 32) -> int:
         # if (value & (1 << (bits - 1))) != 0:
         #     signed_value = value - (1 << bits)